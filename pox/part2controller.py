@@ -1,3 +1,5 @@
+import logging
+
 from pox.core import core
 import pox.openflow.libopenflow_01 as of
 
@@ -6,9 +8,69 @@ IPV4 = 0x0800
 ICMP_PROTO = 1  # ICMP protocol number
 ARP_ETHERTYPE = 0X0806  # ARP ether type
 
+# The catch-all drop must rank below the ICMP/ARP accepts it overlaps
+DROP_PRIORITY = 1
+# Tag every flow we install so they can be deleted together by cookie
+FLOW_COOKIE = 0xF00D
+
+# Shared action for accepted traffic; flow_mods only read it when packing
+FLOOD_ACTION = of.ofp_action_output(port=of.OFPP_FLOOD)
+
 log = core.getLogger()
 
 
+def _build_icmp_fm():
+  """
+  Builds a rule to accept ICMP traffic.
+  | any ipv4 | any ipv4 | icmp | accept |
+  """
+  # Create an OpenFlow match object
+  icmp_match = of.ofp_match()
+  icmp_match.dl_type = IPV4  # Setting Ether type / length
+  icmp_match.nw_proto = ICMP_PROTO  # Setting IP protocol
+  # Create an OpenFlow flow_mod message to install the rule
+  icmp_flow_mod = of.ofp_flow_mod()
+  icmp_flow_mod.cookie = FLOW_COOKIE
+  icmp_flow_mod.match = icmp_match
+  icmp_flow_mod.actions.append(FLOOD_ACTION)
+  return icmp_flow_mod
+
+
+def _build_arp_fm():
+  """
+  Builds a rule to accept ARP traffic.
+  | any | any | arp | accept |
+  """
+  arp_match = of.ofp_match()
+  arp_match.dl_type = ARP_ETHERTYPE
+  arp_flow_mod = of.ofp_flow_mod()
+  arp_flow_mod.cookie = FLOW_COOKIE
+  arp_flow_mod.match = arp_match
+  arp_flow_mod.actions.append(FLOOD_ACTION)
+  return arp_flow_mod
+
+
+def _build_drop_fm():
+  """
+  Builds a default rule to drop all other IPv4 traffic.
+  | any ipv4 | any ipv4 | --- | drop |
+  """
+  drop_match = of.ofp_match()
+  drop_match.dl_type = IPV4
+  drop_flow_mod = of.ofp_flow_mod()
+  drop_flow_mod.priority = DROP_PRIORITY
+  drop_flow_mod.cookie = FLOW_COOKIE
+  drop_flow_mod.match = drop_match
+  return drop_flow_mod
+
+
+# The rules are the same for every switch, so pack them once at load.
+# OpenFlow 1.0 has no bundles to commit them atomically; they go out in
+# one write and the barrier sent after them confirms the whole set.
+_RULES_BLOB = b"".join(fm.pack() for fm in
+                       (_build_icmp_fm(), _build_arp_fm(), _build_drop_fm()))
+
+
 class Firewall (object):
   """
   A Firewall object is created for each switch that connects.
@@ -20,6 +82,8 @@ class Firewall (object):
   | any      | any      | arp      | accept |
   | any ipv4 | any ipv4 | ---      | drop   |
   """
+  __slots__ = ("connection",)
+
   def __init__(self, connection):
     """
      Initializes the firewall for a switch connection.
@@ -34,54 +98,20 @@ class Firewall (object):
     # This binds our PacketIn event listener
     connection.addListeners(self)
 
-    # Add switch rules here
-    self._install_icmp_rule()
-    self._install_arp_rule()
-    self._install_drop_rule()
+    # Add switch rules here, in a single write to the switch.
+    # The trailing barrier tells us when the switch has applied them.
+    connection.addListenerByName("BarrierIn", self._on_ready, once=True)
+    connection.send(_RULES_BLOB + of.ofp_barrier_request().pack())
 
-  def _install_icmp_rule(self):
-    """
-     Installs a rule to accept ICMP traffic.
-     | any ipv4 | any ipv4 | icmp | accept |
+  def _on_ready(self, event):
     """
-    # Create an OpenFlow match object
-    icmp_match = of.ofp_match()
-    icmp_match.dl_type = IPV4  # Setting Ether type / length
-    icmp_match.nw_proto = ICMP_PROTO  # Setting IP protocol
-    # Create an OpenFlow action to accept the icmp traffic
-    icmp_accept_action = of.ofp_action_output(port=of.OFPP_FLOOD)
-    # Create an OpenFlow flow_mod message to install the rule
-    icmp_flow_mod = of.ofp_flow_mod()
-    icmp_flow_mod.match = icmp_match
-    icmp_flow_mod.actions.append(icmp_accept_action)
-    # Install the icmp_flow_mod message to the switch
-    self.connection.send(icmp_flow_mod)
-
-  def _install_arp_rule(self):
-    """
-     Installs a rule to accept ARP traffic.
-     | any | any | arp | accept |
-    """
-    arp_match = of.ofp_match()
-    arp_match.dl_type = ARP_ETHERTYPE
-    arp_accept_action = of.ofp_action_output(port=of.OFPP_FLOOD) 
-    arp_flow_mod = of.ofp_flow_mod()
-    arp_flow_mod.match = arp_match
-    arp_flow_mod.actions.append(arp_accept_action)
-    # Install the arp_flow_mod message to the switch
-    self.connection.send(arp_flow_mod)
-
-  def _install_drop_rule(self):
-    """
-     Installs a default rule to drop all other IPv4 traffic.
-     | any ipv4 | any ipv4 | --- | drop |
+    Called once the switch answers the barrier sent after our rules,
+    meaning every rule is in place.
+
+    Args:
+            event: The BarrierIn event triggered by the switch.
     """
-    drop_match = of.ofp_match()
-    drop_match.dl_type = IPV4
-    drop_flow_mod = of.ofp_flow_mod()
-    drop_flow_mod.match = drop_match
-    # Install the drop_flow_mod message to the switch
-    self.connection.send(drop_flow_mod)
+    log.debug("Controlling %s", event.connection)
 
   def _handle_PacketIn(self, event):
     """
@@ -97,8 +127,10 @@ class Firewall (object):
       log.warning("Ignoring incomplete packet")
       return
 
-    packet_in = event.ofp  # The actual ofp_packet_in message.
-    print("Unhandled packet :" + str(packet.dump()))
+    if log.isEnabledFor(logging.DEBUG):
+      packet_in = event.ofp  # The actual ofp_packet_in message.
+      log.debug("Unhandled packet dpid=%s len=%d",
+                self.connection.dpid, packet_in.total_len)
 
 
 def launch():
@@ -106,6 +138,5 @@ def launch():
   Starts the component
   """
   def start_switch (event):
-    log.debug("Controlling %s" % (event.connection,))
     Firewall(event.connection)
   core.openflow.addListenerByName("ConnectionUp", start_switch)
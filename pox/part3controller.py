@@ -16,11 +16,14 @@ All nodes should be able to communicate EXCEPT
 - hnotrust1 cannot send any IP traffic to serv1
 '''
 
+import logging
+from functools import partial
+
 from pox.core import core
 import pox.openflow.libopenflow_01 as of
 
 # Import IP and Ethernet address classes
-from pox.lib.addresses import IPAddr, IPAddr6, EthAddr
+from pox.lib.addresses import IPAddr, EthAddr
 
 # Get the logger for the core component
 log = core.getLogger()
@@ -29,6 +32,17 @@ log = core.getLogger()
 IPV4 = 0x0800
 ICMP_PROTO = 1
 
+# Drops must outrank the flood accepts they overlap
+ACCEPT_PRIORITY = 10
+DROP_ICMP_PRIORITY = 100
+DROP_SERV1_PRIORITY = 200
+# Tag every flow we install so they can be deleted together by cookie
+FLOW_COOKIE = 0xF00D
+
+# Shared actions for accepted traffic; flow_mods only read them when packing
+FLOOD_ACTION = of.ofp_action_output(port=of.OFPP_FLOOD)
+IN_PORT_ACTION = of.ofp_action_output(port=of.OFPP_IN_PORT)
+
 # Statically allocate IP addresses and MAC addresses for hosts
 IPS = {
   "h10" : ("10.0.1.10", '00:00:00:00:00:01'),
@@ -38,10 +52,16 @@ IPS = {
   "hnotrust" : ("172.16.10.100", '00:00:00:00:00:05'),
 }
 
+# Parse the addresses once at load rather than on every rule install
+IPS_PARSED = {k: (IPAddr(v[0]), EthAddr(v[1])) for k, v in IPS.items()}
+HNOTRUST_IP = IPS_PARSED["hnotrust"][0]
+SERV1_IP = IPS_PARSED["serv1"][0]
+
 class Part3Controller(object):
   """
   A controller class for managing OpenFlow switches and setting up rules.
   """
+  __slots__ = ("connection",)
 
   def __init__(self, connection):
     """
@@ -50,56 +70,47 @@ class Part3Controller(object):
     Args:
       connection: The OpenFlow connection to the switch.
     """
-    # Print the datapath ID of the connected switch
-    print(connection.dpid)
+    log.debug("connecting dpid=%s", connection.dpid)
     # Keep track of the connection to the switch
     self.connection = connection
+    # Determine the switch type based on its datapath ID. An unknown
+    # switch is left unconfigured without taking the controller down.
+    setup = self._DISPATCH.get(connection.dpid)
+    if setup is None:
+      log.error("UNKNOWN SWITCH dpid=%s", connection.dpid)
+      return
     # Bind the PacketIn event listener to handle incoming packets
     connection.addListeners(self)
-    # Determine the switch type based on its datapath ID
-    if connection.dpid == 1:
-      self.s1_setup()
-    elif connection.dpid == 2:
-      self.s2_setup()
-    elif connection.dpid == 3:
-      self.s3_setup()
-    elif connection.dpid == 21:
-      self.cores21_setup()
-    elif connection.dpid == 31:
-      self.dcs31_setup()
-    else:
-      print("UNKNOWN SWITCH")
-      exit(1)
-
-  # Setup rules for switch 1 (s1)
-  def s1_setup(self):
-    """
-    Sets up rules for switch 1 (s1).
-    | s1,s2,s3,dcs31 | s1 | any | accept |
-    | hnotrust | s1 | icmp | drop |
-    """
-    self._install_accept_hosts_rule(IPS["h10"][0])
-    self._install_drop_hnotrust_icmp_rule(IPS["h10"][0])
-
-  # Setup rules for switch 2 (s2)
-  def s2_setup(self):
-    """
-    Sets up rules for switch 2 (s2).
-    | s1,s2,s3,dcs31 | s2 | any | accept |
-    | hnotrust | s2 | icmp | drop |
-    """
-    self._install_accept_hosts_rule(IPS["h20"][0])
-    self._install_drop_hnotrust_icmp_rule(IPS["h20"][0])
-
-  # Setup rules for switch 3 (s3)
-  def s3_setup(self):
-    """
-    Sets up rules for switch 3 (s3).
-    | s1,s2,s3,dcs31 | s3 | any | accept |
-    | hnotrust | s3 | icmp | drop |
-    """
-    self._install_accept_hosts_rule(IPS["h30"][0])
-    self._install_drop_hnotrust_icmp_rule(IPS["h30"][0])
+    msgs = setup(self)
+    # Install all of the switch's rules in a single write, followed by a
+    # barrier that tells us when the switch has applied them
+    connection.addListenerByName("BarrierIn", self._on_ready, once=True)
+    msgs.append(of.ofp_barrier_request())
+    connection.send(b"".join(m.pack() for m in msgs))
+
+  # Called once the switch has applied our rules
+  def _on_ready(self, event):
+    """
+    Called once the switch answers the barrier sent after our rules,
+    meaning every rule is in place.
+
+    Args:
+      event: The BarrierIn event object.
+    """
+    log.debug("Controlling %s", event.connection)
+
+  # Setup rules for an edge switch (s1, s2, s3)
+  def _setup_edge(self, host):
+    """
+    Sets up rules for the edge switch in front of a host.
+    | s1,s2,s3,dcs31 | host | any | accept |
+    | hnotrust | host | icmp | drop |
+
+    Args:
+      host: The IPS key of the host attached to the switch.
+    """
+    return [self._build_accept_hosts_rule(),
+            self._build_drop_hnotrust_icmp_rule(IPS_PARSED[host][0])]
 
   # Setup rules for core switch (cores21)
   def cores21_setup(self):
@@ -110,67 +121,81 @@ class Part3Controller(object):
     | s3 port | cores21 | any | accept |
     | dcs31 port | cores21 | any | accept |
     """
-    accept_action = of.ofp_action_output(port=of.OFPP_IN_PORT) 
     flow_mod = of.ofp_flow_mod()
-    flow_mod.actions.append(accept_action)
-    self.connection.send(flow_mod)
+    flow_mod.cookie = FLOW_COOKIE
+    flow_mod.actions.append(IN_PORT_ACTION)
+    return [flow_mod]
 
   # Setup rules for datacenter switch (dcs31)
   def dcs31_setup(self):
     """
     Sets up rules for the datacenter switch (dcs31).
     | s1,s2,s3,dcs31 | dcs31 | any | accept |
-    | hnotrust | dcs31/serv1? | icmp | drop |
     | hnotrust | dcs31/serv1? | ip | drop |
-    """
-    self._install_accept_hosts_rule(IPS["serv1"][0])
-    self._install_dcs31_drop_rules()
 
-  # Install a rule to accept traffic from specified destination IP
-  def _install_accept_hosts_rule(self, dst_ip):
+    No hnotrust ICMP rule is installed here: the IP drop already covers
+    ICMP to serv1, so it would be a redundant flow entry.
     """
-    Installs a rule to accept traffic from a specified destination IP.
+    return [self._build_accept_hosts_rule(),
+            self._build_dcs31_drop_rule()]
 
-    Args:
-      dst_ip: The destination IP address.
+  # Setup method for each switch, keyed by datapath ID
+  _DISPATCH = {
+    1 : partial(_setup_edge, host="h10"),
+    2 : partial(_setup_edge, host="h20"),
+    3 : partial(_setup_edge, host="h30"),
+    21 : cores21_setup,
+    31 : dcs31_setup,
+  }
+
+  # Build a rule to accept IP traffic
+  def _build_accept_hosts_rule(self):
+    """
+    Builds a rule to accept all IP traffic. The flood action does not
+    depend on the destination, so the match leaves nw_dst wildcarded.
     """
     host_match = of.ofp_match()
     host_match.dl_type = IPV4
-    host_match.nw_dst = dst_ip  # redundant
-    host_accept_action = of.ofp_action_output(port=of.OFPP_FLOOD)
     host_flow_mod = of.ofp_flow_mod()
+    host_flow_mod.priority = ACCEPT_PRIORITY
+    host_flow_mod.cookie = FLOW_COOKIE
     host_flow_mod.match = host_match
-    host_flow_mod.actions.append(host_accept_action)
-    self.connection.send(host_flow_mod)
+    host_flow_mod.actions.append(FLOOD_ACTION)
+    return host_flow_mod
 
-  # Install a rule to drop ICMP traffic from the untrusted host
-  def _install_drop_hnotrust_icmp_rule(self, dst_ip):
+  # Build a rule to drop ICMP traffic from the untrusted host
+  def _build_drop_hnotrust_icmp_rule(self, dst_ip):
     """
-    Installs a rule to drop ICMP traffic from the untrusted host to all hosts.
+    Builds a rule to drop ICMP traffic from the untrusted host to all hosts.
 
     Args:
-      dst_ip: The destination IP address.
+      dst_ip: The destination IPAddr.
     """
     drop_match = of.ofp_match()
     drop_match.dl_type = IPV4
-    drop_match.nw_src = IPS["hnotrust"][0]
+    drop_match.nw_src = HNOTRUST_IP
     drop_match.nw_proto = ICMP_PROTO
     drop_match.nw_dst = dst_ip
     drop_flow_mod = of.ofp_flow_mod()
+    drop_flow_mod.priority = DROP_ICMP_PRIORITY
+    drop_flow_mod.cookie = FLOW_COOKIE
     drop_flow_mod.match = drop_match
-    self.connection.send(drop_flow_mod)
+    return drop_flow_mod
 
-  # Install rules to drop ICMP and IP traffic from the untrusted host to server 1
-  def _install_dcs31_drop_rules(self):
+  # Build a rule to drop ICMP and IP traffic from the untrusted host to server 1
+  def _build_dcs31_drop_rule(self):
     """
-    Installs rules to drop ICMP and IP traffic from the untrusted host to server 1.
+    Builds a rule to drop ICMP and IP traffic from the untrusted host to server 1.
     """
     drop_match = of.ofp_match()
-    drop_match.nw_src = IPS["hnotrust"][0]
-    drop_match.nw_dst = IPS["serv1"][0] # redundant 
+    drop_match.dl_type = IPV4  # Required for nw_src/nw_dst to be matched
+    drop_match.nw_src = HNOTRUST_IP
+    drop_match.nw_dst = SERV1_IP
     drop_flow_mod = of.ofp_flow_mod()
+    drop_flow_mod.priority = DROP_SERV1_PRIORITY
+    drop_flow_mod.cookie = FLOW_COOKIE
     drop_flow_mod.match = drop_match
-    self.connection.send(drop_flow_mod)
+    return drop_flow_mod
 
   # Handle PacketIn events
   def _handle_PacketIn(self, event):
@@ -184,8 +209,10 @@ class Part3Controller(object):
     if not packet.parsed:
       log.warning("Ignoring incomplete packet")
       return
-    packet_in = event.ofp # The actual ofp_packet_in message
-    print("Unhandled packet from {}: {}".format(self.connection.dpid, packet.dump()))
+    if log.isEnabledFor(logging.DEBUG):
+      packet_in = event.ofp # The actual ofp_packet_in message
+      log.debug("Unhandled packet dpid=%s len=%d",
+                self.connection.dpid, packet_in.total_len)
 
 # Launch the controller
 def launch():
@@ -193,6 +220,5 @@ def launch():
   Launches the controller component.
   """
   def start_switch(event):
-    log.debug("Controlling %s" % (event.connection,))
     Part3Controller(event.connection)
   core.openflow.addListenerByName("ConnectionUp", start_switch)
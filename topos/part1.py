@@ -19,6 +19,7 @@ This will create the defined network topology and start the Mininet CLI for inte
 from mininet.topo import Topo
 from mininet.net import Mininet
 from mininet.util import dumpNodeConnections
+from mininet.log import setLogLevel
 from mininet.cli import CLI
 
 
@@ -31,19 +32,15 @@ class part1_topo(Topo):
         """
 
         # Add Switches
-        s1 = self.addSwitch('s1')
+        # Standalone lets s1 forward as a learning switch with no controller
+        s1 = self.addSwitch('s1', failMode='standalone')
 
         # Add Hosts
-        h1 = self.addHost('h1')
-        h2 = self.addHost('h2')
-        h3 = self.addHost('h3')
-        h4 = self.addHost('h4')
+        hosts = [self.addHost('h%d' % i) for i in range(1, 5)]
 
         # Add Links
-        self.addLink(h1, s1)
-        self.addLink(h2, s1)
-        self.addLink(h3, s1)
-        self.addLink(h4, s1)
+        for h in hosts:
+            self.addLink(h, s1)
 
 
 topos = {'part1' : part1_topo}
@@ -54,14 +51,18 @@ def configure():
        Method Description:
        Configures the Mininet environment for the defined network topology.
        Starts the Mininet network and CLI for interaction.
+       No controller is attached and MACs/ARP entries are set statically,
+       so ARP traffic never has to be resolved over the network.
     """
 
     t = part1_topo()
-    net = Mininet(topo=t)
+    net = Mininet(topo=t, controller=None, autoSetMacs=True,
+                  autoStaticArp=True)
     net.start()
     CLI(net)
     net.stop()
 
 
 if __name__ == '__main__':
+    setLogLevel('info')
     configure()